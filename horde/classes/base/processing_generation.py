@@ -45,6 +45,7 @@ class ProcessingGeneration(db.Model):
         uuid_column_type(),
         db.ForeignKey("waiting_prompts.id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     worker_id = db.Column(uuid_column_type(), db.ForeignKey("workers.id"), nullable=False)
     created = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
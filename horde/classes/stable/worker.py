@@ -185,18 +185,24 @@ class ImageWorker(Worker):
     def parse_models(self, unchecked_models):
         # We don't allow more workers to claim they can server more than 100 models atm (to prevent abuse)
         del unchecked_models[300:]
+        worker_models = set(unchecked_models)
         models = set()
-        for model in unchecked_models:
-            usermodel = model.split("::")
-            if self.user.special and len(usermodel) == 2:
-                user_alias = usermodel[1]
-                if self.user.get_unique_alias() != user_alias:
-                    raise e.BadRequest(f"This model can only be hosted by {user_alias}")
-                models.add(model)
-            elif model in model_reference.stable_diffusion_names or self.user.customizer or model in model_reference.testing_models:
-                models.add(model)
-            else:
-                logger.debug(f"Rejecting unknown model '{model}' from {self.name} ({self.id})")
+        if self.user.special:
+            for model in unchecked_models:
+                usermodel = model.split("::")
+                if len(usermodel) == 2:
+                    user_alias = usermodel[1]
+                    if self.user.get_unique_alias() != user_alias:
+                        raise e.BadRequest(f"This model can only be hosted by {user_alias}")
+                    models.add(model)
+        # Everything else is a plain membership check, so we let set intersections do the work
+        if self.user.customizer:
+            models = worker_models
+        else:
+            models |= worker_models.intersection(model_reference.stable_diffusion_names)
+            models |= worker_models.intersection(model_reference.testing_models)
+        for model in worker_models - models:
+            logger.debug(f"Rejecting unknown model '{model}' from {self.name} ({self.id})")
         if len(models) == 0:
             raise e.BadRequest("Unfortunately we cannot accept workers serving unrecognised models at this time")
         return models
@@ -1,4 +1,4 @@
-HORDE_VERSION = "4.35.1"
+HORDE_VERSION = "4.35.2"
 
 WHITELISTED_SERVICE_IPS = {
     "212.227.227.178",  # Turing Bot
@@ -1,5 +1,6 @@
 import ipaddress
 import os
+import time
 from datetime import timedelta
 
 import requests
@@ -37,6 +38,11 @@ else:
     logger.init_err("IP Timeout Cache", status="Failed")
 
 test_timeout = 0
+# IP block timeouts change rarely, so we keep their parsed networks in memory for a few seconds
+# instead of scanning redis for every IP address we check
+BLOCK_TIMEOUTS_CACHE_SECONDS = 10
+cached_block_networks = None
+cached_block_networks_expiry = 0
 
 
 class CounterMeasures:
@@ -169,17 +175,37 @@ class CounterMeasures:
             logger.warning(f"Attempted to inset non-block {ip_block} IP as a block timeout")
             return
         ip_t_r.setex(f"ipblock_{ip_block}", timedelta(minutes=minutes), int(True))
+        CounterMeasures.clear_block_networks_cache()
+
+    @staticmethod
+    def get_block_networks():
+        """Returns the redis key and parsed network of each IP block timeout"""
+        global cached_block_networks, cached_block_networks_expiry
+        if cached_block_networks is None or time.time() > cached_block_networks_expiry:
+            cached_block_networks = [
+                (ip_block_key, ipaddress.ip_network(ip_block_key.decode().split("_", 1)[1]))
+                for ip_block_key in ip_t_r.scan_iter("ipblock_*")
+            ]
+            cached_block_networks_expiry = time.time() + BLOCK_TIMEOUTS_CACHE_SECONDS
+        return cached_block_networks
+
+    @staticmethod
+    def clear_block_networks_cache():
+        global cached_block_networks
+        cached_block_networks = None
 
     @staticmethod
     def retrieve_block_timeout(ipaddr):
         """Checks if the IP is in a block timeout"""
         if not ip_t_r:
             return None
-        for ip_block_key in ip_t_r.scan_iter("ipblock_*"):
-            ip_range = ip_block_key.decode().split("_", 1)[1]
-            if ipaddress.ip_address(ipaddr) in ipaddress.ip_network(ip_range):
+        ip_address = ipaddress.ip_address(ipaddr)
+        for ip_block_key, ip_network in CounterMeasures.get_block_networks():
+            if ip_address in ip_network:
                 ttl = ip_t_r.ttl(ip_block_key)
-                return int(ttl)
+                # The block might have expired since we cached it
+                if ttl > 0:
+                    return int(ttl)
         return 0
 
     @staticmethod
@@ -191,6 +217,7 @@ class CounterMeasures:
             logger.warning(f"Attempted to inset non-block {ip_block} IP as a block timeout")
             return
         ip_t_r.delete(f"ipblock_{ip_block}")
+        CounterMeasures.clear_block_networks_cache()
 
     @staticmethod
     def get_block_timeouts():
@@ -18,7 +18,7 @@ from horde.bridge_reference import (
 from horde.classes.base.detection import Filter
 from horde.classes.base.user import KudosTransferLog, User, UserRecords, UserSharedKey
 from horde.classes.base.waiting_prompt import WPAllowedWorkers, WPModels
-from horde.classes.base.worker import WorkerModel, WorkerPerformance
+from horde.classes.base.worker import WorkerModel, WorkerPerformance, WorkerTemplate
 from horde.classes.kobold.processing_generation import TextProcessingGeneration
 from horde.classes.kobold.waiting_prompt import TextWaitingPrompt
 from horde.classes.kobold.worker import TextWorker
@@ -29,7 +29,7 @@ from horde.classes.stable.waiting_prompt import ImageWaitingPrompt
 from horde.classes.stable.worker import ImageWorker
 from horde.database.classes import FakeWPRow
 from horde.enums import State
-from horde.flask import SQLITE_MODE, db
+from horde.flask import SQLITE_MODE, cache, db
 from horde.logger import logger
 from horde.model_reference import model_reference
 from horde.utils import hash_api_key, validate_regex
@@ -155,6 +155,48 @@ def get_total_usage():
     return totals
 
 
+def get_index_snapshot():
+    """Retrieves the worker totals and active worker counts for all worker types in a single query
+    Returns the same values as get_total_usage() and count_active_workers() for each worker type
+    """
+    worker_types = {wclass.__mapper_args__["polymorphic_identity"]: wtype for wtype, wclass in WORKER_CLASS_MAP.items()}
+    is_active = WorkerTemplate.last_check_in > datetime.utcnow() - timedelta(seconds=300)
+    results = (
+        db.session.query(
+            WorkerTemplate.worker_type,
+            func.sum(WorkerTemplate.contributions).label("contributions"),
+            func.sum(WorkerTemplate.fulfilments).label("fulfilments"),
+            func.count(WorkerTemplate.id).filter(is_active).label("active_workers"),
+            func.sum(WorkerTemplate.threads).filter(is_active).label("active_threads"),
+        )
+        .group_by(WorkerTemplate.worker_type)
+        .all()
+    )
+    totals = {
+        hv.thing_names["image"]: 0,
+        hv.thing_names["text"]: 0,
+        "image_fulfilments": 0,
+        "text_fulfilments": 0,
+        "forms": 0,
+    }
+    active_workers = {wtype: (0, 0) for wtype in WORKER_CLASS_MAP}
+    for result in results:
+        wtype = worker_types.get(result.worker_type)
+        if wtype is None:
+            continue
+        if wtype == "interrogation":
+            totals["forms"] = result.fulfilments or 0
+        else:
+            totals[hv.thing_names[wtype]] = result.contributions or 0
+            totals[f"{wtype}_fulfilments"] = result.fulfilments or 0
+        if result.active_workers and result.active_threads:
+            active_workers[wtype] = (result.active_workers, result.active_threads)
+    return {
+        "totals": totals,
+        "active_workers": active_workers,
+    }
+
+
 def find_user_by_oauth_id(oauth_id):
     if oauth_id == "anon" and not ALLOW_ANONYMOUS:
         return None
@@ -366,10 +408,16 @@ def get_available_models(filter_model_name: str = None):
     return list(models_dict.values())
 
 
+@cache.memoize(timeout=60)
+def get_memoized_available_models():
+    """Used when the redis models cache is unavailable, to avoid aggregating all models from the DB on every request"""
+    return get_available_models()
+
+
 def retrieve_available_models(model_type=None, min_count=None, max_count=None, model_state="known"):
     """Retrieves model details from Redis cache, or from DB if cache is unavailable"""
     if hr.horde_r is None:
-        return get_available_models()
+        return get_memoized_available_models()
     model_cache = hr.horde_r_get("models_cache")
     try:
         models_ret = json.loads(model_cache)
@@ -377,7 +425,7 @@ def retrieve_available_models(model_type=None, min_count=None, max_count=None, m
         logger.error(f"Model cache could not be loaded: {model_cache}")
         return []
     if models_ret is None:
-        models_ret = get_available_models()
+        models_ret = get_memoized_available_models()
     if model_type is not None:
         models_ret = [md for md in models_ret if md.get("type", "image") == model_type]
     if min_count is not None:
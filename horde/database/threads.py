@@ -186,8 +186,9 @@ def check_waiting_prompts():
             (TextWaitingPrompt, TextProcessingGeneration),
         ]:
             expired_wps = db.session.query(wp_class).filter(wp_class.expiry < cutoff_time)
-            logger.info(f"Pruned {expired_wps.count()} expired Waiting Prompts")
-            expired_wps.delete()
+            # delete() returns the rowcount, so we don't need a separate COUNT query
+            pruned_wps = expired_wps.delete()
+            logger.info(f"Pruned {pruned_wps} expired Waiting Prompts")
             db.session.commit()
             # Faults stale ProcGens
             all_proc_gen = (
@@ -240,8 +241,8 @@ def check_interrogations():
         all_source_image_ids = [i.id for i in expired_r_entries.all()]
         for source_image_id in all_source_image_ids:
             delete_source_image(str(source_image_id))
-        logger.info(f"Pruned {expired_entries.count()} expired Interrogations")
-        expired_entries.delete()
+        pruned_interrogations = expired_entries.delete()
+        logger.info(f"Pruned {pruned_interrogations} expired Interrogations")
         db.session.commit()
         # Restarts stale forms
         all_stale_forms = (
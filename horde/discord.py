@@ -3,11 +3,14 @@ import os
 import requests
 from loguru import logger
 
+# Reused so that consecutive notifications keep the connection to discord alive
+webhook_session = requests.Session()
+
 
 def send_webhook(webhook_url: str, message: str):
     data = {"content": message}
     try:
-        req = requests.post(webhook_url, json=data, timeout=2)
+        req = webhook_session.post(webhook_url, json=data, timeout=2)
         if not req.ok:
             logger.warning(f"Something went wrong when sending discord webhook: {req.status_code} - {req.text}")
             return
@@ -1,19 +1,37 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
 from horde.logger import logger
 from horde.threads import PrimaryTimedFunction
 
+# All the references are on the same host, so we keep a single connection alive for all of them
+reference_session = requests.Session()
+
+STABLE_DIFFUSION_BASELINES = frozenset(
+    {
+        "stable diffusion 1",
+        "stable diffusion 2",
+        "stable diffusion 2 512",
+        "stable_diffusion_xl",
+        "stable_cascade",
+    },
+)
+
 
 class ModelReference(PrimaryTimedFunction):
     quorum = None
     reference = None
     text_reference = None
-    stable_diffusion_names = set()
-    text_model_names = set()
+    image_model_names = frozenset()
+    stable_diffusion_names = frozenset()
+    text_model_names = frozenset()
+    text_model_multipliers = {}
+    image_nsfw_models = frozenset()
+    text_nsfw_models = set()
     nsfw_models = set()
-    controlnet_models = set()
+    controlnet_models = frozenset()
     # Workaround because users lacking customizer role are getting models not in the reference stripped away.
     # However due to a racing or caching issue, this causes them to still pick jobs using those models
     # Need to investigate more to remove this workaround
@@ -23,65 +41,95 @@ class ModelReference(PrimaryTimedFunction):
         """Retrieves to nataili and text model reference and stores in it a var"""
         # If it's running in SQLITE_MODE, it means it's a test and we never want to grab the quorum
         # We don't want to report on any random model name a client might request
+        # Each reference is built in local variables and swapped in at the end,
+        # so that concurrent readers never see a half-populated reference
+        # and a failed download leaves the previous snapshot in place.
         for _riter in range(10):
             try:
-                self.reference = requests.get(
-                    os.getenv(
-                        "HORDE_IMAGE_COMPVIS_REFERENCE",
-                        "https://raw.githubusercontent.com/Haidra-Org/AI-Horde-image-model-reference/main/stable_diffusion.json",
-                    ),
-                    timeout=2,
-                ).json()
-                diffusers = requests.get(
-                    os.getenv(
-                        "HORDE_IMAGE_DIFFUSERS_REFERENCE",
-                        "https://raw.githubusercontent.com/Haidra-Org/AI-Horde-image-model-reference/main/diffusers.json",
-                    ),
-                    timeout=2,
-                ).json()
-                self.reference.update(diffusers)
-                # logger.debug(self.reference)
-                self.stable_diffusion_names = set()
-                for model in self.reference:
-                    if self.reference[model].get("baseline") in {
-                        "stable diffusion 1",
-                        "stable diffusion 2",
-                        "stable diffusion 2 512",
-                        "stable_diffusion_xl",
-                        "stable_cascade",
-                    }:
-                        self.stable_diffusion_names.add(model)
-                        if self.reference[model].get("nsfw"):
-                            self.nsfw_models.add(model)
-                        if self.reference[model].get("type") == "controlnet":
-                            self.controlnet_models.add(model)
+                # The two image references are independent, so we download them in parallel
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    compvis_future = executor.submit(
+                        reference_session.get,
+                        os.getenv(
+                            "HORDE_IMAGE_COMPVIS_REFERENCE",
+                            "https://raw.githubusercontent.com/Haidra-Org/AI-Horde-image-model-reference/main/stable_diffusion.json",
+                        ),
+                        timeout=2,
+                    )
+                    diffusers_future = executor.submit(
+                        reference_session.get,
+                        os.getenv(
+                            "HORDE_IMAGE_DIFFUSERS_REFERENCE",
+                            "https://raw.githubusercontent.com/Haidra-Org/AI-Horde-image-model-reference/main/diffusers.json",
+                        ),
+                        timeout=2,
+                    )
+                    new_reference = compvis_future.result().json()
+                    diffusers = diffusers_future.result().json()
+                new_reference.update(diffusers)
+                # logger.debug(new_reference)
+                new_stable_diffusion_names = frozenset(
+                    model for model, details in new_reference.items() if details.get("baseline") in STABLE_DIFFUSION_BASELINES
+                )
+                new_image_nsfw_models = frozenset(model for model in new_stable_diffusion_names if new_reference[model].get("nsfw"))
+                new_controlnet_models = frozenset(
+                    model for model in new_stable_diffusion_names if new_reference[model].get("type") == "controlnet"
+                )
+                (
+                    self.reference,
+                    self.image_model_names,
+                    self.stable_diffusion_names,
+                    self.image_nsfw_models,
+                    self.controlnet_models,
+                ) = (
+                    new_reference,
+                    frozenset(new_reference),
+                    new_stable_diffusion_names,
+                    new_image_nsfw_models,
+                    new_controlnet_models,
+                )
                 break
             except Exception as e:
                 logger.error(f"Error when downloading nataili models list: {e}")
         for _riter in range(10):
             try:
-                self.text_reference = requests.get(
+                new_text_reference = reference_session.get(
                     os.getenv(
                         "HORDE_IMAGE_LLM_REFERENCE",
                         "https://raw.githubusercontent.com/db0/AI-Horde-text-model-reference/main/db.json",
                     ),
                     timeout=2,
                 ).json()
-                # logger.debug(self.reference)
-                self.text_model_names = set()
-                for model in self.text_reference:
-                    self.text_model_names.add(model)
-                    if self.text_reference[model].get("nsfw"):
-                        self.nsfw_models.add(model)
+                # logger.debug(new_text_reference)
+                new_text_nsfw_models = set()
+                new_text_model_multipliers = {}
+                for model in new_text_reference:
+                    if new_text_reference[model].get("nsfw"):
+                        new_text_nsfw_models.add(model)
+                    # We precalculate the param multiplier so that we don't parse it on every kudos calculation
+                    if "parameters" in new_text_reference[model]:
+                        new_text_model_multipliers[model] = int(new_text_reference[model]["parameters"]) / 1000000000
+                (
+                    self.text_reference,
+                    self.text_model_names,
+                    self.text_nsfw_models,
+                    self.text_model_multipliers,
+                ) = (
+                    new_text_reference,
+                    frozenset(new_text_reference),
+                    new_text_nsfw_models,
+                    new_text_model_multipliers,
+                )
                 break
             except Exception as err:
                 logger.error(f"Error when downloading known models list: {err}")
+        self.nsfw_models = self.image_nsfw_models | self.text_nsfw_models
 
     def get_image_model_names(self):
-        return set(self.reference.keys())
+        return self.image_model_names
 
     def get_text_model_names(self):
-        return set(self.text_reference.keys())
+        return self.text_model_names
 
     def get_model_baseline(self, model_name):
         model_details = self.reference.get(model_name, {})
@@ -102,16 +150,18 @@ class ModelReference(PrimaryTimedFunction):
         model_details = self.reference.get(model_name, {})
         return set(model_details.get("csam_whitelist", []))
 
+    @staticmethod
+    def strip_model_username(model_name):
+        """Returns the model name without the '::username' suffix of named text models"""
+        # partition() avoids allocating a list for the common case where there's no username
+        base_name, sep, username = model_name.partition("::")
+        if sep and "::" not in username:
+            return base_name
+        return model_name
+
     def get_text_model_multiplier(self, model_name):
-        # To avoid doing this calculations all the time
-        usermodel = model_name.split("::")
-        if len(usermodel) == 2:
-            model_name = usermodel[0]
-        if not self.text_reference.get(model_name):
-            return 1
-        multiplier = int(self.text_reference[model_name]["parameters"]) / 1000000000
-        logger.debug(f"{model_name} param multiplier: {multiplier}")
-        return multiplier
+        model_name = self.strip_model_username(model_name)
+        return self.text_model_multipliers.get(model_name, 1)
 
     def has_inpainting_models(self, model_names):
         for model_name in model_names:
@@ -134,10 +184,7 @@ class ModelReference(PrimaryTimedFunction):
 
     def is_known_text_model(self, model_name):
         # If it's a named model, we check if we can find it without the username
-        usermodel = model_name.split("::")
-        if len(usermodel) == 2:
-            model_name = usermodel[0]
-        return model_name in self.get_text_model_names()
+        return self.strip_model_username(model_name) in self.get_text_model_names()
 
     def has_unknown_models(self, model_names):
         if len(model_names) == 0:
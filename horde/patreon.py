@@ -7,6 +7,9 @@ from horde.threads import PrimaryTimedFunction
 
 class PatreonCache(PrimaryTimedFunction):
     patrons = {}
+    # Precalculated on each refresh, as they're shown on the sponsors page
+    sponsor_page_names = ""
+    sponsors = []
 
     def call_function(self):
         try:
@@ -15,6 +18,8 @@ class PatreonCache(PrimaryTimedFunction):
             for pid in patrons_json:
                 self.patrons[int(pid)] = patrons_json[pid]
             # logger.debug(self.patrons)
+            self.sponsor_page_names = ", ".join(self.get_names(min_entitlement=3, max_entitlement=99))
+            self.sponsors = self.get_sponsors()
         except (TypeError, AttributeError):
             logger.warning("Patreon cache could not be retrieved from redis. Leaving existing cache.")
         except Exception as e:
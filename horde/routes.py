@@ -1,94 +1,139 @@
+import hashlib
 import os
-import random
 import secrets
+import time
+from string import Formatter
 from uuid import uuid4
 
 import oauthlib
 import requests
-from flask import redirect, render_template, request, send_from_directory, url_for
+from flask import make_response, redirect, render_template, request, send_from_directory, session, url_for
 from flask_dance.contrib.discord import discord
 from flask_dance.contrib.github import github
 from flask_dance.contrib.google import google
-from markdown import markdown
+from requests.adapters import HTTPAdapter
 
 from horde import vars as hv
 from horde.argparser import maintenance
 from horde.classes.base import settings
 from horde.classes.base.news import News
 from horde.classes.base.user import User
+from horde.consts import HORDE_VERSION
 from horde.countermeasures import CounterMeasures
 from horde.database import functions as database
 from horde.flask import HORDE, cache, db
 from horde.logger import logger
 from horde.patreon import patrons
-from horde.utils import ConvertAmount, hash_api_key, is_profane, sanitize_string
+from horde.utils import ConvertAmount, hash_api_key, is_profane, render_markdown, sanitize_string
 from horde.vars import (
     google_verification_string,
     horde_contact_email,
     horde_title,
     horde_url,
     img_url,
+    index_markdown_path,
+    privacy_policy_template,
+    recaptcha_secret_key,
+    recaptcha_site_key,
+    terms_of_service_template,
 )
 
-dance_return_to = "/"
+# Reused across registrations so that we keep the connection to the recaptcha API alive
+recaptcha_session = requests.Session()
+recaptcha_session.mount("https://", HTTPAdapter(pool_maxsize=64))
 
+# How long we trust a previously retrieved oauth ID for the same access token
+OAUTH_ID_CACHE_SECONDS = 300
 
-@logger.catch(reraise=True)
-@HORDE.route("/")
-# @cache.cached(timeout=300)
-def index():
-    with open(os.getenv("HORDE_MARKDOWN_INDEX", "index_stable.md")) as index_file:
-        index = index_file.read()
-    align_image = 0
-    big_image = align_image
-    while big_image == align_image:
-        big_image = random.randint(1, 5)
-    policies = """
+# Set this to reload the index markdown from disk on every request, when editing it locally
+DEV_RELOAD = os.getenv("HORDE_DEV_RELOAD", "0") == "1"
+POLICIES_MARKDOWN = """
 ## Policies
 
 [Privacy Policy](/privacy)
 
 [Terms of Service](/terms)"""
-    news = ""
-    sorted_news = News().sorted_news()
-    for riter in range(len(sorted_news)):
-        news += f"* {sorted_news[riter]['newspiece']}\n"
-        if riter > 1:
-            break
-    totals = database.get_total_usage()
+
+
+def read_index_template():
+    """Reads the index markdown and splits it into (literal, field_name, format_spec) segments
+    so that the str.format() parsing is only done once
+    """
+    with open(index_markdown_path) as index_file:
+        template = index_file.read()
+    return [(literal, field_name, format_spec) for literal, field_name, format_spec, _conversion in Formatter().parse(template)]
+
+
+def fill_index_template(segments, **values):
+    return "".join(
+        literal if field_name is None else literal + format(values[field_name], format_spec)
+        for literal, field_name, format_spec in segments
+    )
+
+
+# The index prose and the policies never change at runtime, so we read and render them only once
+INDEX_TEMPLATE = read_index_template()
+POLICIES_HTML = render_markdown(POLICIES_MARKDOWN)
+# The stylesheet is served as a static asset, so that browsers can cache it across page loads
+INDEX_HEAD = f"""<head>
+    <title>{horde_title}</title>
+    <meta name="google-site-verification" content="{google_verification_string}" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <link rel="stylesheet" href="/assets/index.css?v={HORDE_VERSION}" />
+    </head>
+    """
+
+
+@logger.catch(reraise=True)
+@HORDE.route("/")
+def index():
+    index_html, index_etag = render_index(maintenance.active)
+    response = make_response(index_html)
+    response.set_etag(index_etag)
+    response.headers["Cache-Control"] = "public, max-age=30"
+    return response.make_conditional(request)
+
+
+@cache.memoize(timeout=30, unless=lambda: DEV_RELOAD)
+def render_index(maintenance_active):
+    """Renders the index page HTML and its ETag.
+    The stats shown change slowly, so we only rebuild the page every 30 seconds
+    """
+    index = read_index_template() if DEV_RELOAD else INDEX_TEMPLATE
+    align_image = 0
+    news = "".join([f"* {newspiece['newspiece']}\n" for newspiece in News().sorted_news()[:3]])
+    snapshot = database.get_index_snapshot()
+    totals = snapshot["totals"]
     processing_totals = database.retrieve_totals()
-    (
-        interrogation_worker_count,
-        interrogation_worker_thread_count,
-    ) = database.count_active_workers("interrogation")
-    image_worker_count, image_worker_thread_count = database.count_active_workers("image")
-    text_worker_count, text_worker_thread_count = database.count_active_workers("text")
+    interrogation_worker_count, interrogation_worker_thread_count = snapshot["active_workers"]["interrogation"]
+    image_worker_count, image_worker_thread_count = snapshot["active_workers"]["image"]
+    text_worker_count, text_worker_thread_count = snapshot["active_workers"]["text"]
     avg_performance = ConvertAmount(database.get_request_avg() * image_worker_thread_count)
     avg_text_performance = ConvertAmount(database.get_request_avg("text") * image_worker_thread_count)
+    image_thing_name, text_thing_name = hv.thing_names["image"], hv.thing_names["text"]
+    raw_image_thing_name, raw_text_thing_name = hv.raw_thing_names["image"], hv.raw_thing_names["text"]
+    image_thing_divisor, text_thing_divisor = hv.thing_divisors["image"], hv.thing_divisors["text"]
     # We multiple with the divisor again, to get the raw amount, which we can convert to prefix accurately
-    total_image_things = ConvertAmount(totals[hv.thing_names["image"]] * hv.thing_divisors["image"])
-    total_text_things = ConvertAmount(totals[hv.thing_names["text"]] * hv.thing_divisors["text"])
-    queued_image_things = ConvertAmount(
-        processing_totals[f"queued_{hv.thing_names['image']}"] * hv.thing_divisors["image"],
-    )
-    queued_text_things = ConvertAmount(
-        processing_totals[f"queued_{hv.thing_names['text']}"] * hv.thing_divisors["text"],
-    )
+    total_image_things = ConvertAmount(totals[image_thing_name] * image_thing_divisor)
+    total_text_things = ConvertAmount(totals[text_thing_name] * text_thing_divisor)
+    queued_image_things = ConvertAmount(processing_totals[f"queued_{image_thing_name}"] * image_thing_divisor)
+    queued_text_things = ConvertAmount(processing_totals[f"queued_{text_thing_name}"] * text_thing_divisor)
     total_image_fulfillments = ConvertAmount(totals["image_fulfilments"])
     total_text_fulfillments = ConvertAmount(totals["text_fulfilments"])
     total_forms = ConvertAmount(totals["forms"])
-    findex = index.format(
+    findex = fill_index_template(
+        index,
         page_title=horde_title,
         horde_img_url=img_url,
         horde_image=align_image,
         avg_performance=avg_performance.amount,
-        avg_thing_name=avg_performance.prefix + hv.raw_thing_names["image"],
+        avg_thing_name=avg_performance.prefix + raw_image_thing_name,
         avg_text_performance=avg_text_performance.amount,
-        avg_text_thing_name=avg_text_performance.prefix + hv.raw_thing_names["text"],
+        avg_text_thing_name=avg_text_performance.prefix + raw_text_thing_name,
         total_image_things=total_image_things.amount,
-        total_total_image_things_name=total_image_things.prefix + hv.raw_thing_names["image"],
+        total_total_image_things_name=total_image_things.prefix + raw_image_thing_name,
         total_text_things=total_text_things.amount,
-        total_text_things_name=total_text_things.prefix + hv.raw_thing_names["text"],
+        total_text_things_name=total_text_things.prefix + raw_text_thing_name,
         total_image_fulfillments=total_image_fulfillments.amount,
         total_image_fulfillments_char=total_image_fulfillments.char,
         total_text_fulfillments=total_text_fulfillments.amount,
@@ -105,50 +150,45 @@ def index():
         total_text_queue=processing_totals["queued_text_requests"],
         total_forms_queue=processing_totals.get("queued_forms", 0),
         queued_image_things=queued_image_things.amount,
-        queued_image_things_name=queued_image_things.prefix + hv.raw_thing_names["image"],
+        queued_image_things_name=queued_image_things.prefix + raw_image_thing_name,
         queued_text_things=queued_text_things.amount,
-        queued_text_things_name=queued_text_things.prefix + hv.raw_thing_names["text"],
-        maintenance_mode=maintenance.active,
+        queued_text_things_name=queued_text_things.prefix + raw_text_thing_name,
+        maintenance_mode=maintenance_active,
         news=news,
     )
 
-    style = """<style>
-        body {
-            max-width: 120ex;
-            margin: 0 auto;
-            color: #333333;
-            line-height: 1.4;
-            font-family: sans-serif;
-            padding: 1em;
-        }
-        </style>
-    """
-
-    head = f"""<head>
-    <title>{horde_title}</title>
-    <meta name="google-site-verification" content="{google_verification_string}" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    {style}
-    </head>
-    """
-    return head + markdown(findex + policies)
+    index_html = INDEX_HEAD + render_markdown(findex) + POLICIES_HTML
+    return index_html, hashlib.sha256(index_html.encode()).hexdigest()
 
 
 @HORDE.route("/sponsors")
 @logger.catch(reraise=True)
 @cache.cached(timeout=300)
 def patrons_route():
-    all_patrons = ", ".join(patrons.get_names(min_entitlement=3, max_entitlement=99))
     return render_template(
         "sponsors.html",
         page_title="Sponsors",
-        all_patrons=all_patrons,
-        all_sponsors=patrons.get_sponsors(),
+        all_patrons=patrons.sponsor_page_names,
+        all_sponsors=patrons.sponsors,
     )
 
 
+def get_oauth_token_hash():
+    """Returns a hash of the access token of the first authorized oauth provider, or None if not logged in"""
+    for blueprint in (google, discord, github):
+        if blueprint.authorized:
+            return hashlib.sha256(blueprint.token["access_token"].encode()).hexdigest()
+    return None
+
+
 @logger.catch(reraise=True)
 def get_oauth_id():
+    # We remember the oauth ID for this token for a few minutes
+    # so that every page load or form retry doesn't need to query the oauth provider again
+    token_hash = get_oauth_token_hash()
+    cached_oauth = session.get("oauth_id_cache")
+    if token_hash and cached_oauth and cached_oauth["token_hash"] == token_hash and cached_oauth["expires"] > time.time():
+        return cached_oauth["oauth_id"]
     google_data = None
     discord_data = None
     github_data = None
@@ -191,6 +231,12 @@ def get_oauth_id():
         oauth_id = f'gh_{github_data["id"]}'
     elif patreon_data:
         oauth_id = f'p_{patreon_data["id"]}'
+    if oauth_id and token_hash:
+        session["oauth_id_cache"] = {
+            "token_hash": token_hash,
+            "oauth_id": oauth_id,
+            "expires": time.time() + OAUTH_ID_CACHE_SECONDS,
+        }
     return oauth_id
 
 
@@ -207,16 +253,13 @@ def register():
         user = database.find_user_by_oauth_id(oauth_id)
         if user:
             username = user.username
-    use_recaptcha = True
-    secret_key = os.getenv("RECAPTCHA_SECRET_KEY")
-    if not secret_key:
-        use_recaptcha = False
+    use_recaptcha = bool(recaptcha_secret_key)
     if request.method == "POST":
         if use_recaptcha:
             try:
                 recaptcha_response = request.form["g-recaptcha-response"]
-                payload = {"response": recaptcha_response, "secret": secret_key}
-                response = requests.post("https://www.google.com/recaptcha/api/siteverify", payload)
+                payload = {"response": recaptcha_response, "secret": recaptcha_secret_key}
+                response = recaptcha_session.post("https://www.google.com/recaptcha/api/siteverify", payload, timeout=(3, 10))
                 if not response.ok or not response.json()["success"]:
                     return render_template(
                         "recaptcha_error.html",
@@ -269,7 +312,7 @@ def register():
         "register.html",
         page_title=f"Join the {horde_title}!",
         use_recaptcha=use_recaptcha,
-        recaptcha_site=os.getenv("RECAPTCHA_SITE_KEY"),
+        recaptcha_site=recaptcha_site_key,
         welcome=welcome,
         user=user,
         api_key=api_key,
@@ -327,44 +370,37 @@ def transfer():
 
 @HORDE.route("/google/<return_to>")
 def google_login(return_to):
-    global dance_return_to
-    dance_return_to = "/" + return_to
+    session["dance_return_to"] = "/" + return_to
     return redirect(url_for("google.login"))
 
 
 @HORDE.route("/discord/<return_to>")
 def discord_login(return_to):
-    global dance_return_to
-    dance_return_to = "/" + return_to
+    session["dance_return_to"] = "/" + return_to
     return redirect(url_for("discord.login"))
 
 
 @HORDE.route("/github/<return_to>")
 def github_login(return_to):
-    global dance_return_to
-    dance_return_to = "/" + return_to
+    session["dance_return_to"] = "/" + return_to
     return redirect(url_for("github.login"))
 
 
 # @HORDE.route('/patreon/<return_to>')
 # def patreon_login(return_to):
-#     global dance_return_to
-#     dance_return_to = '/' + return_to
+#     session["dance_return_to"] = '/' + return_to
 #     return redirect('/patreon/patreon')
 
 
 @HORDE.route("/finish_dance")
 def finish_dance():
-    global dance_return_to
-    redirect_url = dance_return_to
-    dance_return_to = "/"
-    return redirect(redirect_url)
+    return redirect(session.pop("dance_return_to", "/"))
 
 
 @HORDE.route("/privacy")
 def privacy():
     return render_template(
-        os.getenv("HORDE_HTML_PRIVACY", "privacy_policy.html"),
+        privacy_policy_template,
         horde_title=horde_title,
         horde_url=horde_url,
         horde_contact_email=horde_contact_email,
@@ -374,7 +410,7 @@ def privacy():
 @HORDE.route("/terms")
 def terms():
     return render_template(
-        os.getenv("HORDE_HTML_TERMS", "terms_of_service.html"),
+        terms_of_service_template,
         horde_title=horde_title,
         horde_url=horde_url,
         horde_contact_email=horde_contact_email,
@@ -383,4 +419,5 @@ def terms():
 
 @HORDE.route("/assets/<filename>")
 def assets(filename):
-    return send_from_directory("../assets", filename)
+    # Assets only change between releases, and index.css is requested with the horde version to bust the cache
+    return send_from_directory("../assets", filename, max_age=31536000, conditional=True)
@@ -7,9 +7,11 @@ import uuid
 from datetime import datetime
 
 import bleach
+import cmarkgfm
 import dateutil.relativedelta
 import regex as re
 from better_profanity import profanity
+from cmarkgfm.cmark import Options as cmarkgfmOptions
 from profanity_check import predict
 
 from horde.flask import SQLITE_MODE
@@ -27,6 +29,13 @@ def is_profane(text):
     return False
 
 
+def render_markdown(text):
+    """Renders markdown to HTML using the C-backed cmark-gfm parser
+    Raw HTML is allowed through, as our markdown pages are trusted and embed images
+    """
+    return cmarkgfm.github_flavored_markdown_to_html(text, options=cmarkgfmOptions.CMARK_OPT_UNSAFE)
+
+
 def count_digits(number):
     digits = 1
     while number > 10:
@@ -39,4 +39,9 @@ horde_title = os.getenv("HORDE_TITLE", "AI Horde")
 horde_noun = os.getenv("HORDE_noun", "horde")
 horde_url = os.getenv("HORDE_URL", "https://aihorde.net")
 horde_contact_email = os.getenv("HORDE_EMAIL", "aihorde@dbzer0.com")
+index_markdown_path = os.getenv("HORDE_MARKDOWN_INDEX", "index_stable.md")
+privacy_policy_template = os.getenv("HORDE_HTML_PRIVACY", "privacy_policy.html")
+terms_of_service_template = os.getenv("HORDE_HTML_TERMS", "terms_of_service.html")
+recaptcha_secret_key = os.getenv("RECAPTCHA_SECRET_KEY")
+recaptcha_site_key = os.getenv("RECAPTCHA_SITE_KEY")
 horde_instance_id = str(uuid4())